@@ -1,25 +1,32 @@
  
 import os
-import json
-import re
+import asyncio
+import orjson
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
 from markdownify import markdownify as md
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 
 BASE_URL = "https://tds.s-anand.net/#/2025-01"
 BASE_ORIGIN = "https://tds.s-anand.net"
+BASE_NETLOC = urlparse(BASE_ORIGIN).netloc
 OUTPUT_DIR = "markdown_files"
-METADATA_FILE = "metadata.json"
+METADATA_FILE = "metadata.jsonl"
+MAX_CONCURRENCY = 8
+# Assets that are not needed to extract page text
+BLOCKED_ASSETS = "**/*.{png,jpg,jpeg,gif,svg,webp,ico,woff,woff2,ttf,css}"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 visited = set()
-metadata = []
+pages_saved = 0
+
+# Characters not allowed in filenames, mapped to underscores
+_SANITIZE_TABLE = str.maketrans({c: "_" for c in '\\/*?:"<>|'})
 
 def sanitize_filename(title):
     """Create a safe filename from title"""
-    return re.sub(r'[\\/*?:"<>|]', "_", title).strip().replace(" ", "_")
+    return title.translate(_SANITIZE_TABLE).strip().replace(" ", "_")
 
 def normalize_url(url):
     """Ensure consistent URL format"""
@@ -29,127 +36,184 @@ def normalize_url(url):
         return urljoin(BASE_ORIGIN, url)
     return url
 
-def extract_all_links(page):
+# Registered once per context; walks elements natively, including shadow DOM (common in SPAs)
+EXTRACT_LINKS_SCRIPT = '''
+window.__extractLinks = () => {
+    const links = new Set();
+    const walk = (root) => {
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+        let node;
+        while ((node = walker.nextNode())) {
+            if (node.tagName === 'A' && node.href) links.add(node.href);
+            if (node.shadowRoot) walk(node.shadowRoot);
+        }
+    };
+    walk(document);
+    return Array.from(links);
+};
+'''
+
+async def extract_all_links(page):
     """Extract all links from the page, including those in shadow DOM"""
-    return page.evaluate('''() => {
-        const links = new Set();
-        // Regular links
-        document.querySelectorAll('a[href]').forEach(a => {
-            if (a.href) links.add(a.href);
-        });
-        // Links in shadow DOM (common in SPAs)
-        const walker = (node) => {
-            if (node.shadowRoot) {
-                node.shadowRoot.querySelectorAll('a[href]').forEach(a => {
-                    if (a.href) links.add(a.href);
-                });
-                node.shadowRoot.querySelectorAll('*').forEach(walker);
-            }
-        };
-        document.querySelectorAll('*').forEach(walker);
-        return Array.from(links);
-    }''')
-
-def wait_for_content(page):
-    """Wait for the main content to load"""
+    return await page.evaluate('window.__extractLinks()')
+
+async def wait_for_content(page):
+    """Wait for docsify to render the route's markdown into the article"""
     try:
-        page.wait_for_selector('article.markdown-section', timeout=10000)
+        await page.wait_for_function(
+            "() => document.querySelector('article.markdown-section')?.childElementCount > 0",
+            timeout=10000
+        )
         return True
     except:
         return False
 
-def save_page_content(page, url):
+async def save_page_content(page, url, metadata_file):
     """Save the page content as markdown"""
+    global pages_saved
     try:
-        if not wait_for_content(page):
+        if not await wait_for_content(page):
             print(f"⏳ Content not found for {url}")
             return None
 
-        title = page.title().split(" - ")[0].strip() or f"page_{len(visited)}"
+        title = (await page.title()).split(" - ")[0].strip() or f"page_{len(visited)}"
         filename = sanitize_filename(title)
         filepath = os.path.join(OUTPUT_DIR, f"{filename}.md")
 
         # Get the main content HTML
-        content_html = page.inner_html('article.markdown-section')
+        content_html = await page.inner_html('article.markdown-section')
         markdown = md(content_html)
 
+        downloaded_at = datetime.now().isoformat()
+
         # Save markdown file with front matter
         with open(filepath, "w", encoding="utf-8") as f:
-            f.write("---\n")
-            f.write(f"title: \"{title}\"\n")
-            f.write(f"original_url: \"{url}\"\n")
-            f.write(f"downloaded_at: \"{datetime.now().isoformat()}\"\n")
-            f.write("---\n\n")
-            f.write(markdown)
-
-        # Add to metadata
-        metadata.append({
+            f.write(
+                "---\n"
+                f"title: \"{title}\"\n"
+                f"original_url: \"{url}\"\n"
+                f"downloaded_at: \"{downloaded_at}\"\n"
+                "---\n\n"
+                f"{markdown}"
+            )
+
+        # Append to metadata
+        save_metadata(metadata_file, {
             "title": title,
             "filename": f"{filename}.md",
             "original_url": url,
-            "downloaded_at": datetime.now().isoformat()
+            "downloaded_at": downloaded_at
         })
+        pages_saved += 1
 
         return filename
     except Exception as e:
         print(f"❌ Error saving {url}: {str(e)}")
         return None
 
-def crawl_page(page, url):
-    """Recursively crawl pages"""
-    normalized_url = normalize_url(url)
-    
-    if normalized_url in visited:
-        return
-    visited.add(normalized_url)
-
-    print(f"🌐 Visiting: {normalized_url}")
+async def crawl_page(page, url, metadata_file):
+    """Crawl a single page and return the internal links found on it"""
+    print(f"🌐 Visiting: {url}")
     
     try:
-        # Navigate to the page
-        page.goto(normalized_url, wait_until="networkidle", timeout=15000)
+        # Navigate to the page; wait_for_content gates on the rendered markdown
+        await page.goto(url, wait_until="domcontentloaded", timeout=10000)
         
         # Save the content
-        filename = save_page_content(page, normalized_url)
+        filename = await save_page_content(page, url, metadata_file)
         if not filename:
-            return
+            return []
 
         # Extract all links from the page
-        links = extract_all_links(page)
-        internal_links = [
+        links = await extract_all_links(page)
+        return [
             link for link in links
-            if urlparse(link).netloc == urlparse(BASE_ORIGIN).netloc
+            if urlparse(link).netloc == BASE_NETLOC
         ]
 
-        # Recursively crawl internal links
-        for link in internal_links:
-            if link not in visited:
-                crawl_page(page, link)
-
     except Exception as e:
-        print(f"🚨 Error crawling {normalized_url}: {str(e)}")
-
-def save_metadata():
-    """Save the metadata file"""
-    with open(METADATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2)
-
-def main():
-    with sync_playwright() as playwright:
-        browser = playwright.chromium.launch(headless=False)  # Set headless=False for debugging
-        context = browser.new_context()
-        page = context.new_page()
-
-        # Start crawling from the base URL
-        crawl_page(page, BASE_URL)
+        print(f"🚨 Error crawling {url}: {str(e)}")
+        return []
+
+async def crawl_worker(context, queue, metadata_file):
+    """Pull URLs off the shared queue and crawl each on a fresh page"""
+    while True:
+        url = await queue.get()
+        try:
+            # None is the shutdown sentinel
+            if url is None:
+                return
+
+            # Reusing a page would make docsify hash routes same-document
+            # navigations that return before the new route has rendered
+            page = await context.new_page()
+            try:
+                links = await crawl_page(page, url, metadata_file)
+            finally:
+                await page.close()
+
+            # Mark links visited before queueing so each URL is fetched once
+            for link in links:
+                normalized_link = normalize_url(link)
+                if normalized_link not in visited:
+                    visited.add(normalized_link)
+                    queue.put_nowait(normalized_link)
+        finally:
+            queue.task_done()
+
+def save_metadata(metadata_file, entry):
+    """Append a metadata entry to the JSONL metadata file"""
+    metadata_file.write(orjson.dumps(entry) + b"\n")
+    metadata_file.flush()
+
+async def main():
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(
+            headless=True,  # Set headless=False for debugging
+            args=["--disable-dev-shm-usage"]
+        )
+        context = await browser.new_context()
+        await context.route(BLOCKED_ASSETS, lambda route: route.abort())
+        await context.add_init_script(EXTRACT_LINKS_SCRIPT)
+
+        # Metadata is appended per page so progress survives a crash; earlier
+        # runs are kept and load_markdown_content keeps the latest entry per URL
+        with open(METADATA_FILE, "ab") as metadata_file:
+            # Start crawling from the base URL with a pool of workers sharing one context
+            queue = asyncio.Queue()
+            start_url = normalize_url(BASE_URL)
+            visited.add(start_url)
+            queue.put_nowait(start_url)
+            workers = [
+                asyncio.create_task(crawl_worker(context, queue, metadata_file))
+                for _ in range(MAX_CONCURRENCY)
+            ]
+            # Wait for the queue to drain, but stop early if a worker dies:
+            # its remaining items would never be marked done and join() would hang
+            drained = asyncio.create_task(queue.join())
+            done, _ = await asyncio.wait(
+                [drained, *workers],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if drained not in done:
+                drained.cancel()
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                for task in done:
+                    task.result()
+                raise RuntimeError("Crawl worker exited before the queue was drained")
+
+            # Queue is drained; stop each worker with a sentinel
+            for _ in workers:
+                queue.put_nowait(None)
+            await asyncio.gather(*workers)
 
-        # Save metadata when done
-        save_metadata()
         print(f"✅ Saved metadata to {METADATA_FILE}")
-        print(f"📁 Total pages saved: {len(metadata)}")
+        print(f"📁 Total pages saved: {pages_saved}")
 
-        context.close()
-        browser.close()
+        await context.close()
+        await browser.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,14 +1,26 @@
 import os
-import json
+import orjson
 import re
 from langchain.text_splitter import RecursiveCharacterTextSplitter,MarkdownHeaderTextSplitter
 from langchain.docstore.document import Document
-from typing import List,Dict,Optional
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
+from typing import List,Dict,Optional,Iterable,Iterator
+from datetime import datetime, timedelta, timezone
+from selectolax.lexbor import LexborHTMLParser
 from langchain.embeddings import OpenAIEmbeddings
-from urllib.parse import urlparse
 import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from functools import lru_cache
+
+
+_NETLOC_RE = re.compile(r'^https?://([^/?#]+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=8192)
+def _url_domain(url: str) -> str:
+    """Return the host part of an http(s) URL, or '' if there is none"""
+    match = _NETLOC_RE.match(url)
+    return match.group(1) if match else ''
 
 
 class TDSDataProcessor:
@@ -28,21 +40,32 @@ class TDSDataProcessor:
                 ("####", "Header 4")
             ]
         )
-        self.discourse_quote_re = re.compile(r'^\[quote=.*?\].*?\[\/quote\]\s*',  re.DOTALL | re.MULTILINE)
-        self.mention_re = re.compile(r'@\w+\b')
         self.url_re = re.compile(r'https?://\S+|www\.\S+')
-        self.code_block_re = re.compile(r'```.*?```', re.DOTALL)
+        # Quotes, code blocks, URLs and mentions in a single pass for Discourse
+        self.discourse_re = re.compile(
+            r'(?P<quote>^\[quote=.*?\].*?\[\/quote\]\s*)'
+            r'|(?P<code>```.*?```)'
+            r'|(?P<url>https?://\S+|www\.\S+)'
+            r'|(?P<mention>@\w+\b)',
+            re.DOTALL | re.MULTILINE
+        )
         self.whitespace_re = re.compile(r'\s+')
-        self.empty_line_re = re.compile(r'\n\s*\n')
+        self.front_matter_re = re.compile(r'\A---(.*?)---', re.DOTALL)
+        self.front_matter_field_re = re.compile(r'^([^:\n]*):(.*)$', re.MULTILINE)
     
     def load_markdown_content(self, metadata_file: str, markdown_dir: str) -> List[Dict]:
-        """Load and combine markdown files with their metadata"""
-        with open(metadata_file, 'r') as f:
-            metadata = json.load(f)
+        """Load and combine markdown files with their JSONL metadata"""
+        # The crawler appends across runs, so later entries for a URL win
+        metadata = {}
+        with open(metadata_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    entry = orjson.loads(line)
+                    metadata[entry['original_url']] = entry
         
         documents = []
         
-        for item in metadata:
+        for item in metadata.values():
             filepath = os.path.join(markdown_dir, item['filename'])
             if os.path.exists(filepath):
                 with open(filepath, 'r', encoding='utf-8') as f:
@@ -50,16 +73,13 @@ class TDSDataProcessor:
                     
                     # Extract front matter if exists
                     front_matter = {}
-                    if content.startswith('---'):
-                        parts = content.split('---', 2)
-                        if len(parts) >= 3:
-                            front_matter_str = parts[1]
-                            content = parts[2]
-                            
-                            for line in front_matter_str.split('\n'):
-                                if ':' in line:
-                                    key, value = line.split(':', 1)
-                                    front_matter[key.strip()] = value.strip().strip('"')
+                    match = self.front_matter_re.match(content)
+                    if match:
+                        front_matter = {
+                            key.strip(): value.strip().strip('"')
+                            for key, value in self.front_matter_field_re.findall(match.group(1))
+                        }
+                        content = content[match.end():]
                     
                     # Combine metadata sources
                     combined_metadata = {
@@ -80,68 +100,81 @@ class TDSDataProcessor:
         if not text:
             return ""
         
-        # Remove HTML tags
-        text = BeautifulSoup(text, 'html.parser').get_text()
+        # Remove HTML tags; skip the parser for text with no markup or entities
+        if '<' in text or '&' in text:
+            text = LexborHTMLParser(text).text()
         
-        # Discourse-specific cleaning
+        # Discourse cleaning also strips URLs; course content only needs URLs removed
         if is_discourse:
-            text = self.discourse_quote_re.sub('', text)
-            text = self.mention_re.sub('', text)
-            text = self.code_block_re.sub('[code]', text)
+            text = self.discourse_re.sub(self._discourse_replacement, text)
+        else:
+            text = self.url_re.sub('', text)
         
-        # General cleaning
-        text = self.url_re.sub('', text)
+        # Collapse whitespace (this also folds blank lines)
         text = self.whitespace_re.sub(' ', text)
-        text = self.empty_line_re.sub('\n\n', text)
         
         return text.strip()
+
+    @staticmethod
+    def _discourse_replacement(match: re.Match) -> str:
+        """Replace code blocks with a marker and drop other Discourse matches"""
+        return '[code]' if match.lastgroup == 'code' else ''
     
-    def process_course_content(self, documents: List[Dict]) -> List[Document]:
-        """Process course markdown content into chunks"""
+    def process_course_content(self, documents: List[Dict],
+                               max_workers: Optional[int] = None) -> List[Document]:
+        """Process course markdown content into chunks across worker processes"""
         processed_docs = []
         
-        for doc in documents:
-            content = doc['content']
-            metadata = doc['metadata']
+        # Workers get a pickled copy of self so they use this instance's settings
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_init_worker,
+                                 initargs=(self,)) as executor:
+            for chunks in executor.map(_process_one_doc, documents, chunksize=16):
+                processed_docs.extend(Document(**chunk) for chunk in chunks)
+        
+        return processed_docs
+    
+    def process_document(self, doc: Dict) -> List[Document]:
+        """Split a single course document into cleaned chunks"""
+        content = doc['content']
+        metadata = doc['metadata']
+        processed_docs = []
+        
+        try:
+            # First split by headers
+            header_splits = self.header_splitter.split_text(content)
             
-            try:
-                # First split by headers
-                header_splits = self.header_splitter.split_text(content)
+            for split in header_splits:
+                # Then split by chunk size if needed
+                chunks = self.markdown_splitter.split_documents([split])
                 
-                for split in header_splits:
-                    # Then split by chunk size if needed
-                    chunks = self.markdown_splitter.split_documents([split])
+                for chunk in chunks:
+                    # Create document with combined metadata
+                    final_metadata = {
+                        **metadata,
+                        **chunk.metadata,
+                        'doc_id': hashlib.blake2b(chunk.page_content.encode('utf-8'), digest_size=16).hexdigest()
+                    }
                     
-                    for chunk in chunks:
-                        # Create document with combined metadata
-                        final_metadata = {
-                            **metadata,
-                            **chunk.metadata,
-                            'doc_id': hashlib.md5(chunk.page_content.encode()).hexdigest()
-                        }
-                        
-                        processed_docs.append(Document(
-                            page_content=self.clean_text(chunk.page_content),
-                            metadata=final_metadata
-                        ))
-                        
-            except Exception as e:
-                print(f"Error processing {metadata.get('filename')}: {str(e)}")
-                # Fallback to simple splitting
-                chunks = self.markdown_splitter.create_documents(
-                    [self.clean_text(content)],
-                    [metadata]
-                )
-                processed_docs.extend(chunks)
+                    processed_docs.append(Document(
+                        page_content=self.clean_text(chunk.page_content),
+                        metadata=final_metadata
+                    ))
+                    
+        except Exception as e:
+            print(f"Error processing {metadata.get('filename')}: {str(e)}")
+            # Fallback to simple splitting
+            processed_docs = self.markdown_splitter.create_documents(
+                [self.clean_text(content)],
+                [metadata]
+            )
         
         return processed_docs
     
-    def process_discourse_posts(self, input_file: str) -> List[Document]:
-        """Process Discourse JSON data into chunks"""
-        with open(input_file, 'r', encoding='utf-8') as f:
-            posts = json.load(f)
-        
-        processed_docs = []
+    def process_discourse_posts(self, input_file: str) -> Iterator[Document]:
+        """Process Discourse JSON data into chunks, yielding them one at a time"""
+        with open(input_file, 'rb') as f:
+            posts = orjson.loads(f.read())
         
         for post in posts:
             content = self.clean_text(post.get('content', ''), is_discourse=True)
@@ -163,25 +196,21 @@ class TDSDataProcessor:
                 'like_count': post.get('like_count', 0),
                 'tags': post.get('tags', []),
                 'post_type': 'answer' if post.get('is_reply') else 'question',
-                'doc_id': hashlib.md5(content.encode()).hexdigest()
+                'doc_id': hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
             }
             
             # Split content into chunks if needed
-            chunks = self.markdown_splitter.create_documents(
+            yield from self.markdown_splitter.create_documents(
                 [content],
                 [metadata]
             )
-            
-            processed_docs.extend(chunks)
-        
-        return processed_docs
-    def enhance_metadata(self, documents: List[Document]) -> List[Document]:
-        """Add derived metadata and quality scoring"""
+    
+    def enhance_metadata(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Add derived metadata and quality scoring as documents stream through"""
         for doc in documents:
             # Add domain from URL
             if 'url' in doc.metadata:
-                parsed = urlparse(doc.metadata['url'])
-                doc.metadata['domain'] = parsed.netloc
+                doc.metadata['domain'] = _url_domain(doc.metadata['url'])
             
             # Different quality scoring for course vs discourse
             if doc.metadata['source'] == 'course_content':
@@ -201,65 +230,71 @@ class TDSDataProcessor:
                     doc.metadata['content_type'] = 'code_' + doc.metadata['post_type']
                 else:
                     doc.metadata['content_type'] = 'text_' + doc.metadata['post_type']
-        
-        return documents
+            
+            yield doc
     
-    def filter_by_date(self, documents: List[Document], 
+    def filter_by_date(self, documents: Iterable[Document], 
                       date_from: str, 
-                      date_to: str) -> List[Document]:
+                      date_to: str) -> Iterable[Document]:
         """Filter documents by date range (ISO format strings)"""
         if not date_from or not date_to:
             return documents
             
         date_from = datetime.fromisoformat(date_from)
         date_to = datetime.fromisoformat(date_to)
-        filtered = []
-        
-        for doc in documents:
-            created_at = doc.metadata.get('created_at')
-            if not created_at:
-                continue
-                
-            try:
-                post_date = datetime.strptime(
-                    created_at, 
-                    "%Y-%m-%dT%H:%M:%S.%fZ"
-                )
-            except ValueError:
-                try:
-                    post_date = datetime.strptime(
-                        created_at, 
-                        "%Y-%m-%dT%H:%M:%SZ"
-                    )
-                except:
-                    continue
-            
-            if date_from <= post_date <= date_to:
-                filtered.append(doc)
         
-        return filtered
+        return (
+            doc for doc in documents
+            if (post_date := self._parse_timestamp(doc.metadata.get('created_at')))
+            and date_from <= post_date <= date_to
+        )
+
+    @staticmethod
+    def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+        """Parse a Discourse ISO timestamp as a naive UTC datetime"""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value[:-1] if value.endswith('Z') else value)
+        except ValueError:
+            return None
+        # Offset timestamps would be aware and fail to compare with date_from/date_to
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
     
     def save_processed_data(self, 
-                          documents: List[Document], 
+                          documents: Iterable[Document], 
                           output_file: str,
                           min_quality: float = 0.0):
-        """Save processed documents to JSON file"""
-        serializable = []
-        
-        for doc in documents:
-            if doc.metadata.get('quality_score', 0) >= min_quality:
-                serializable.append({
-                    'page_content': doc.page_content,
-                    'metadata': doc.metadata
-                })
-        
+        """Stream processed documents into a JSON array file"""
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(serializable, f, ensure_ascii=False, indent=2)
+        # Documents are produced lazily while writing, so any upstream error
+        # surfaces mid-write; only replace output_file once the array is complete
+        tmp_file = output_file + '.tmp'
+        saved = 0
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(b'[')
+                for doc in documents:
+                    if doc.metadata.get('quality_score', 0) < min_quality:
+                        continue
+                    f.write(b',\n' if saved else b'\n')
+                    f.write(orjson.dumps({
+                        'page_content': doc.page_content,
+                        'metadata': doc.metadata
+                    }, option=orjson.OPT_INDENT_2))
+                    saved += 1
+                f.write(b'\n]')
+            os.replace(tmp_file, output_file)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
         
-        print(f"✅ Saved {len(serializable)} documents to {output_file}")
+        print(f"✅ Saved {saved} documents to {output_file}")
     
     def run_pipeline(self, config: Dict):
         """Complete processing pipeline"""
@@ -273,7 +308,10 @@ class TDSDataProcessor:
                 config['markdown_metadata'],
                 config['markdown_dir']
             )
-            course_docs = self.process_course_content(markdown_content)
+            course_docs = self.process_course_content(
+                markdown_content,
+                max_workers=config.get('max_workers')
+            )
             print(f"  Processed {len(course_docs)} course content chunks")
         
         # Process discourse posts if configured
@@ -289,12 +327,10 @@ class TDSDataProcessor:
                     config['date_from'],
                     config['date_to']
                 )
-            print(f"  Processed {len(discourse_docs)} Discourse posts")
         
-        # Combine and enhance all documents
-        all_docs = course_docs + discourse_docs
-        print(f"🔗 Combining {len(all_docs)} total documents...")
-        enhanced_docs = self.enhance_metadata(all_docs)
+        # Combine and enhance all documents; discourse chunks stream straight to disk
+        print("🔗 Combining and enhancing documents...")
+        enhanced_docs = self.enhance_metadata(chain(course_docs, discourse_docs))
         
         # Save results
         self.save_processed_data(
@@ -304,11 +340,30 @@ class TDSDataProcessor:
         )
         
         print("🎉 Data processing complete!")
-    
+
+
+# One processor per worker process, so splitters and regexes are unpickled once
+_worker_processor = None
+
+
+def _init_worker(processor: 'TDSDataProcessor'):
+    """Install the caller's processor for this worker process"""
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _process_one_doc(doc: Dict) -> List[Dict]:
+    """Chunk one course document, returning plain dicts to keep pickling cheap"""
+    return [
+        {'page_content': chunk.page_content, 'metadata': chunk.metadata}
+        for chunk in _worker_processor.process_document(doc)
+    ]
+
+
 if __name__ == "__main__":
     # Example configuration matching your data
     config = {
-        "markdown_metadata": "metadata.json",
+        "markdown_metadata": "metadata.jsonl",
         "markdown_dir": "markdown_files",
         "discourse_input": "discourse_posts.json",
         "date_from": "2025-01-01",
@@ -1,24 +1,36 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from pydantic import BaseModel
 from typing import Optional
-import base64
+import asyncio
+import pybase64
 from io import BytesIO
 from PIL import Image
 from langchain_core.messages import HumanMessage
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 
-from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores import Chroma, FAISS
 
 from langchain_openai import OpenAIEmbeddings
 import os
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
+from itertools import islice
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Prewarm the Chroma index and embedding client so the first request doesn't pay for it
+    try:
+        vectordb.similarity_search("warmup", k=1)
+    except Exception as e:
+        print(f"Vector store warmup failed: {e}")
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS configuration
 app.add_middleware(
@@ -41,14 +53,17 @@ class AnswerResponse(BaseModel):
     links: list[LinkResponse]
 
 # Initialize components
-# embeddings = OpenAIEmbeddings(openai_api_key=os.getenv('OPENAI_API_KEY'),
-#             base_url=os.getenv("EMBEDDINGS_BASE_URL"),
-#             model="text-embedding-3-small")
-vectordb = Chroma(
-        persist_directory="chroma_db",
-        embedding_function=OpenAIEmbeddings(openai_api_key=os.getenv('OPENAI_API_KEY'),
+embeddings = OpenAIEmbeddings(openai_api_key=os.getenv('OPENAI_API_KEY'),
             base_url=os.getenv("EMBEDDINGS_BASE_URL"),
-            model="text-embedding-3-small"))
+            model="text-embedding-3-small")
+# VECTOR_STORE=faiss serves the int8-quantized index built by vector_store.py
+if os.getenv("VECTOR_STORE") == "faiss":
+    vectordb = FAISS.load_local("faiss_index", embeddings,
+            allow_dangerous_deserialization=True)
+else:
+    vectordb = Chroma(
+            persist_directory="chroma_db",
+            embedding_function=embeddings)
  
 llm = ChatOpenAI( openai_api_key=os.getenv("OPENAI_API_KEY"),
             base_url=os.getenv("OPENAI_BASE_URL"),
@@ -88,21 +103,30 @@ qa_chain = RetrievalQA.from_chain_type(
 # Singleton instance
  
 
-def process_image(image_base64: str) -> str:
+def prepare_image(image_base64: str) -> str:
+    """Decode, downscale and re-encode an image as base64 JPEG"""
+    # Decode base64 image
+    image_data = pybase64.b64decode(image_base64)
+    image = Image.open(BytesIO(image_data))
+    
+    # JPEG has no alpha channel or palette; converting first also keeps Pillow
+    # from falling back to NEAREST resampling for palette and 1-bit images
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    
+    # Shrink to fit 1024x1024 keeping aspect ratio (no-op for smaller images)
+    image.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+    
+    # Convert back to base64
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG", quality=85)
+    return pybase64.b64encode(buffered.getvalue()).decode('ascii')
+
+async def process_image(image_base64: str) -> str:
     """Extract text description from image using multimodal LLM"""
     try:
-        # Decode base64 image
-        image_data = base64.b64decode(image_base64)
-        image = Image.open(BytesIO(image_data))
-        
-        # Resize if needed (to reduce token usage)
-        if image.size[0] > 1024 or image.size[1] > 1024:
-            image = image.resize((1024, 1024))
-        
-        # Convert back to base64
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG")
-        processed_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        # CPU-bound decode/resize/encode runs off the event loop
+        processed_base64 = await asyncio.to_thread(prepare_image, image_base64)
         
         # Get description from multimodal LLM
         message = HumanMessage(
@@ -111,11 +135,21 @@ def process_image(image_base64: str) -> str:
                 {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{processed_base64}"}},
             ]
         )
-        response = multimodal_llm.invoke([message])
+        response = await multimodal_llm.ainvoke([message])
         return response.content
     except Exception as e:
         print(f"Error processing image: {e}")
         
+def iter_links(docs):
+    """Yield a link for each source document with a URL not seen before"""
+    seen_urls = set()
+    for doc in docs:
+        url = doc.metadata.get("url")
+        if url and url not in seen_urls:
+            seen_urls.add(url)
+            snippet = doc.page_content[:200].replace("\n", " ") + "..."
+            yield LinkResponse(url=url, text=snippet)
+
 @app.get("/")
 def root():
     return {"message": "Virtual TA API is live. Try /api."}
@@ -136,26 +170,17 @@ async def answer_question(
 
         # If image is present, process it and append to question context
         if image_base64:
-            image_desc = process_image(image_base64)
+            image_desc = await process_image(image_base64)
             if question:
                 question = f"{question}\n\nImage context: {image_desc}"
             else:
                 question = image_desc
 
         # Get the answer and source documents from RAG chain
-        result = qa_chain({"query": question})
-
-        # Collect links from source docs without duplicates
-        seen_urls = set()
-        links = []
-        for doc in result.get("source_documents", []):
-            url = doc.metadata.get("url", "")
-            if url and url not in seen_urls:
-                seen_urls.add(url)
-                snippet = doc.page_content[:200].replace("\n", " ") + "..."
-                links.append(LinkResponse(url=url, text=snippet))
-                if len(links) >= 5:  # limit to top 2 links
-                    break
+        result = await qa_chain.ainvoke({"query": question})
+
+        # Collect up to 5 links from source docs without duplicates
+        links = list(islice(iter_links(result.get("source_documents", [])), 5))
 
         return AnswerResponse(answer=result["result"], links=links)
 
@@ -1,19 +1,76 @@
  
-from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores import Chroma, FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
-import json
+import asyncio
+import faiss
+import numpy as np
+import httpx
+import orjson
 import os
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from pydantic import PrivateAttr
 
 load_dotenv()
 
+class BatchedOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings that sends chunk_size-sized batches concurrently
+
+    Batches run on a private event loop, so the concurrent path is only used
+    from synchronous code; call close() when done to release the loop.
+    """
+    max_concurrency: int = 8
+    # Pooled async connections are bound to the loop that opened them, so
+    # every call runs on the same loop instead of a fresh asyncio.run()
+    _loop: asyncio.AbstractEventLoop = PrivateAttr(default_factory=asyncio.new_event_loop)
+
+    def embed_documents(self, texts: List[str],
+                        chunk_size: Optional[int] = None) -> List[List[float]]:
+        """Embed texts in batches, running up to max_concurrency requests at once"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._loop.run_until_complete(
+                self._aembed_batches(texts, chunk_size or self.chunk_size)
+            )
+        # run_until_complete can't nest inside a running loop; embed serially instead
+        return super().embed_documents(texts, chunk_size=chunk_size)
+
+    def close(self) -> None:
+        """Close the pooled async HTTP client and the private event loop"""
+        if self._loop.is_closed():
+            return
+        if self.http_async_client is not None:
+            self._loop.run_until_complete(self.http_async_client.aclose())
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+
+    async def _aembed_batches(self, texts: List[str], chunk_size: int) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.aembed_documents(batch, chunk_size=chunk_size)
+
+        batches = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
 class VectorStoreBuilder:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"),
+        # Share one HTTP/2 connection pool across all embedding requests
+        limits = httpx.Limits(max_keepalive_connections=32, max_connections=32)
+        self.embeddings = BatchedOpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"),
                                         model="text-embedding-3-small",
-                                        base_url=os.getenv("EMBEDDINGS_BASE_URL"))
+                                        base_url=os.getenv("EMBEDDINGS_BASE_URL"),
+                                        chunk_size=500,
+                                        max_retries=6,
+                                        http_client=httpx.Client(http2=True, limits=limits),
+                                        http_async_client=httpx.AsyncClient(http2=True, limits=limits))
         self.persist_directory = "chroma_db"
+        self.faiss_directory = "faiss_index"
     def clean_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Convert all metadata values to ChromaDB-compatible types"""
         if not isinstance(metadata, dict):
@@ -42,9 +99,9 @@ class VectorStoreBuilder:
     def load_processed_data(self, input_file: str):
         """Load and clean documents and metadata from JSON file"""
         try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            with open(input_file, 'rb') as f:
+                data = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError) as e:
             print(f"Error loading input file: {e}")
             return [], []
         
@@ -92,6 +149,40 @@ class VectorStoreBuilder:
             print(f"Error creating vector store: {e}")
             return None
 
+    def build_quantized_vector_store(self, documents: list, metadatas: list):
+        """Build and persist a FAISS HNSW index over 8-bit scalar-quantized vectors"""
+        if not documents:
+            print("No documents to process")
+            return None
+            
+        print(f"Building quantized vector store with {len(documents)} documents...")
+        
+        try:
+            vectors = np.asarray(self.embeddings.embed_documents(documents), dtype=np.float32)
+            
+            # int8 codes take a quarter of the memory of the float32 vectors
+            index = faiss.IndexHNSWSQ(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, 32)
+            index.train(vectors)
+            index.add(vectors)
+            index.hnsw.efSearch = 64
+            
+            docstore = InMemoryDocstore({
+                str(i): Document(page_content=text, metadata=metadata)
+                for i, (text, metadata) in enumerate(zip(documents, metadatas))
+            })
+            vectordb = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id={i: str(i) for i in range(len(documents))}
+            )
+            vectordb.save_local(self.faiss_directory)
+            print("✅ Quantized vector store created successfully")
+            return vectordb
+        except Exception as e:
+            print(f"Error creating quantized vector store: {e}")
+            return None
+
 if __name__ == "__main__":
     builder = VectorStoreBuilder()
     
@@ -103,7 +194,11 @@ if __name__ == "__main__":
     if not documents:
         print("No documents loaded - check your input file")
     else:
-        vectordb = builder.build_vector_store(documents, metadatas)
+        # VECTOR_STORE=faiss builds the int8-quantized FAISS index instead of Chroma
+        if os.getenv("VECTOR_STORE") == "faiss":
+            vectordb = builder.build_quantized_vector_store(documents, metadatas)
+        else:
+            vectordb = builder.build_vector_store(documents, metadatas)
         
         if vectordb:
             retriever = vectordb.as_retriever(
@@ -118,6 +213,8 @@ if __name__ == "__main__":
                 print("Metadata:", results[0].metadata)
             else:
                 print("No results found for test query (MMR)")
+    
+    builder.embeddings.close()
 
              
     